@@ -10,17 +10,99 @@ Features:
 - Filters by latitude/longitude bounding box and date range
 - Handles measurement flags (MFLAG) and quality flags (QFLAG)
 - Optionally excludes networks like CoCoRaHS or any not desired data sources
-- Converts precipitation (PRCP) from tenths of mm → mm
+- Keeps precipitation (PRCP) in GHCN's native tenths of mm as int16
 
 Author: Omid Zandi
 Affiliation: University of Arizoan, Department of Hydrology and Atmospheric Sciences
 """
 
+import os
+import sys
+import shutil
+import threading
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+from pyarrow import csv
 from pathlib import Path
-from concurrent.futures import ProcessPoolExecutor, as_completed
+from functools import lru_cache
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from tqdm import tqdm
+
+
+def _flag_mask_numpy(mflag, qflag, keep_codes, empty_qcode):
+    """Rows whose MFLAG code is kept and whose QFLAG code is the empty flag."""
+    if keep_codes.size == 0:
+        return np.zeros(mflag.size, dtype=bool)
+    # keep_codes is sorted: binary-search each code instead of hashing it
+    idx = np.searchsorted(keep_codes, mflag)
+    found = keep_codes[np.minimum(idx, keep_codes.size - 1)] == mflag
+    return found & (qflag == empty_qcode)
+
+
+try:
+    from numba import njit
+except ImportError:  # numba is optional
+    _flag_mask = _flag_mask_numpy
+else:
+    # Serial on purpose: the worker pool already saturates cores
+    @njit(cache=True)
+    def _flag_mask(mflag, qflag, keep_codes, empty_qcode):
+        """Rows whose MFLAG code is kept and whose QFLAG code is the empty flag."""
+        out = np.empty(mflag.size, dtype=np.bool_)
+        for i in range(mflag.size):
+            keep = False
+            for code in keep_codes:
+                if mflag[i] == code:
+                    keep = True
+                    break
+            out[i] = keep and qflag[i] == empty_qcode
+        return out
+
 
 class GHCNPreprocessor:
+    # Columns read from each station file; element columns such as TMAX,
+    # TMIN or SNOW are never parsed
+    USECOLS = [
+        "STATION", "DATE", "LATITUDE", "LONGITUDE",
+        "ELEVATION", "NAME", "PRCP", "PRCP_ATTRIBUTES",
+    ]
+    # Arrow types for the parse. STATION is one repeated ID, so it is
+    # dictionary-encoded (a pandas categorical). PRCP is read as text because
+    # GHCN pads values with spaces, and is cast to int16 after trimming.
+    DTYPES = {
+        "STATION": pa.dictionary(pa.int32(), pa.string()),
+        "DATE": pa.date32(),
+        "LATITUDE": pa.float32(),
+        "LONGITUDE": pa.float32(),
+        "ELEVATION": pa.float32(),
+        "NAME": pa.string(),
+        "PRCP": pa.string(),
+        "PRCP_ATTRIBUTES": pa.string(),
+    }
+
+    # Station files per worker task. US COOP IDs embed a state code, so the
+    # in-box stations sit together in the ID-sorted list; many small
+    # contiguous batches spread them over all workers.
+    BATCH_SIZE = 32
+
+    # Columns written to the output, in order
+    OUTPUT_SCHEMA = pa.schema([
+        ("STATION", pa.string()),
+        ("DATE", pa.date32()),
+        ("LATITUDE", pa.float32()),
+        ("LONGITUDE", pa.float32()),
+        ("ELEVATION", pa.float32()),
+        ("NAME", pa.string()),
+        ("PRCP", pa.int16()),
+        ("PRCP_ATTRIBUTES", pa.string()),
+        ("MFLAG", pa.string()),
+        ("QFLAG", pa.string()),
+    ])
+
     def __init__(
         self,
         folder: str,
@@ -34,6 +116,7 @@ class GHCNPreprocessor:
         exclude_prefixes: tuple = ("US1",),
         keep_mflags: list = None,
         max_workers: int = 24,
+        stations_file: str = None,
     ):
         """
         Initialize the GHCN preprocessor.
@@ -43,98 +126,433 @@ class GHCNPreprocessor:
         self.min_lat, self.max_lat = min_lat, max_lat
         self.min_lon, self.max_lon = min_lon, max_lon
         self.start_date, self.end_date = start_date, end_date
-        self.exclude_prefixes = exclude_prefixes
+        # Date bounds as days since the epoch, matching Arrow's date32 storage
+        epoch = pd.Timestamp("1970-01-01")
+        self._start_d32 = (pd.Timestamp(start_date) - epoch).days
+        self._end_d32 = (pd.Timestamp(end_date) - epoch).days
+        # str.startswith takes a tuple; accept a bare string such as "US1" too
+        self.exclude_prefixes = (
+            (exclude_prefixes,) if isinstance(exclude_prefixes, str) else tuple(exclude_prefixes)
+        )
         self.max_workers = max_workers
+        self.stations_file = Path(stations_file) if stations_file is not None else None
 
         self.keep_mflags = (
             keep_mflags
             if keep_mflags is not None
             else ["", "G", "B", "N", "S", "T", "A", "E"]
         )
+        # Fixed MFLAG categories (kept flags plus the trace flags) give every
+        # file the same codes, so membership is settled once here. Any other
+        # flag becomes NaN and is dropped like any flag not in keep_mflags.
+        self._mflag_categories = sorted(set(self.keep_mflags) | {"S", "T"})
+        self._keep_codes = np.unique(
+            np.array([self._mflag_categories.index(m) for m in self.keep_mflags], dtype=np.int8)
+        )
+        self._trace_codes = np.array(
+            [self._mflag_categories.index(m) for m in ("S", "T")], dtype=np.int8
+        )
 
     # -------------------------------------------------------------------------
     @staticmethod
-    def _split_flags(df: pd.DataFrame) -> pd.DataFrame:
-        """Split PRCP_ATTRIBUTES into MFLAG, QFLAG, and SFLAG."""
-        if "PRCP_ATTRIBUTES" not in df:
-            df["MFLAG"] = df["QFLAG"] = df["SFLAG"] = ""
-            return df
-
-        flags = df["PRCP_ATTRIBUTES"].fillna("").astype(str).str.split(",", expand=True)
-        df["MFLAG"] = flags[0].fillna("").str.strip()
-        df["QFLAG"] = flags[1].fillna("").str.strip()
-        df["SFLAG"] = flags[2].fillna("").str.strip()
+    def _split_flags(df: pd.DataFrame, mflag_categories: list) -> pd.DataFrame:
+        """Split PRCP_ATTRIBUTES into MFLAG and QFLAG."""
+        # Peel one field at a time; cheaper than split(expand=True), which
+        # builds a list per row and a column for every trailing field.
+        # The source flag (SFLAG) is never used, so it is not extracted.
+        mflag = df["PRCP_ATTRIBUTES"].fillna("").astype(str).str.partition(",")
+        qflag = mflag[2].str.partition(",")
+
+        # A handful of single-character codes repeated on every row; MFLAGs
+        # outside the fixed categories get code -1 (NaN)
+        codes = pd.Index(mflag_categories).get_indexer(mflag[0].str.strip())
+        df["MFLAG"] = pd.Categorical.from_codes(codes, categories=mflag_categories)
+        df["QFLAG"] = pd.Categorical(qflag[0].str.strip())
         return df
 
     # -------------------------------------------------------------------------
     def _filter_flags(self, df: pd.DataFrame) -> pd.DataFrame:
         """Apply Measurement (MFLAG) and Quality (QFLAG) filtering."""
-        df = self._split_flags(df)
+        df = self._split_flags(df, self._mflag_categories)
 
-        # Keep only valid MFLAGs and passed QFLAGs
-        df = df[df["MFLAG"].isin(self.keep_mflags)]
-        df = df[(df["QFLAG"].isna()) | (df["QFLAG"].str.strip() == "")]
+        # Keep only valid MFLAGs and passed QFLAGs: one pass over the
+        # category codes, then a single slice
+        qcats = df["QFLAG"].cat.categories
+        empty_qcode = qcats.get_loc("") if "" in qcats else -2  # -1 is NaN's code
+        keep = _flag_mask(
+            df["MFLAG"].cat.codes.to_numpy(), df["QFLAG"].cat.codes.to_numpy(),
+            self._keep_codes, empty_qcode,
+        )
+        df = df[keep]
 
-        # Handle trace values
-        df.loc[df["MFLAG"].isin(["S", "T"]), "PRCP"] = 0.0
+        # Handle trace values: match on category codes, zero PRCP in one pass
+        trace = np.isin(df["MFLAG"].cat.codes.to_numpy(), self._trace_codes)
+        df["PRCP"] = df["PRCP"].mask(trace, 0)
         return df
 
     # -------------------------------------------------------------------------
-    def _process_one_file(self, file: Path) -> pd.DataFrame | None:
+    def _load_station_index(self) -> set:
+        """Return IDs of stations in ghcnd-stations.txt that fall in the bounding box."""
+        stations = pd.read_fwf(
+            self.stations_file,
+            colspecs=[(0, 11), (12, 20), (21, 30)],
+            names=["ID", "LATITUDE", "LONGITUDE"],
+            header=None,
+        )
+        in_box = (
+            stations["LATITUDE"].between(self.min_lat, self.max_lat)
+            & stations["LONGITUDE"].between(self.min_lon, self.max_lon)
+            & ~stations["ID"].str.startswith(self.exclude_prefixes)
+        )
+        return set(stations.loc[in_box, "ID"])
+
+    # -------------------------------------------------------------------------
+    @staticmethod
+    @lru_cache(maxsize=None)
+    def _coord_columns(header: str) -> tuple[int, int]:
+        """Return the LATITUDE and LONGITUDE positions in a CSV header line."""
+        names = [c.strip().strip('"') for c in header.split(",")]
+        return names.index("LATITUDE"), names.index("LONGITUDE")
+
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def _parse_prcp(prcp: pa.ChunkedArray) -> pa.ChunkedArray:
+        """
+        Convert padded PRCP text to int16 tenths of mm.
+
+        Like pd.to_numeric(errors="coerce"), blank, non-numeric, or
+        out-of-range values become null instead of failing the station.
+        Tenths of mm fit int16 (±3.2 m/day); no float conversion needed.
+        """
+        prcp = pc.utf8_trim_whitespace(prcp)
+        prcp = pc.if_else(pc.match_substring_regex(prcp, r"^[+-]?\d{1,9}$"), prcp, None)
+        prcp = pc.cast(prcp, pa.int32())
+        in_range = pc.and_(pc.greater_equal(prcp, -32768), pc.less_equal(prcp, 32767))
+        return pc.cast(pc.if_else(in_range, prcp, None), pa.int16())
+
+    # -------------------------------------------------------------------------
+    def _process_one_file(self, file: Path) -> pa.Table | None:
         """Read, clean, and filter one station file."""
         try:
-            # Exclude unwanted station types
-            if file.name.startswith(self.exclude_prefixes):
+            # Every row of a station file has the same coordinates, so check
+            # the bounding box on the first data row before parsing the rest.
+            # Coordinates precede NAME, the only field that contains commas.
+            with open(file) as f:
+                header, first = f.readline(), f.readline()
+            i_lat, i_lon = self._coord_columns(header)
+            fields = first.split(",")
+            lat, lon = float(fields[i_lat].strip('"')), float(fields[i_lon].strip('"'))
+            if not (self.min_lat <= lat <= self.max_lat and self.min_lon <= lon <= self.max_lon):
                 return None
 
-            df = pd.read_csv(file, parse_dates=["DATE"], low_memory=False)
+            # Arrow's C++ reader on a memory map (fewer read() calls on shared
+            # storage); the worker pool already saturates cores, so keep each
+            # parse single-threaded.
+            with pa.memory_map(str(file), "r") as source:
+                t = csv.read_csv(
+                    source,
+                    read_options=csv.ReadOptions(use_threads=False),
+                    convert_options=csv.ConvertOptions(
+                        include_columns=self.USECOLS,
+                        column_types=self.DTYPES,
+                        strings_can_be_null=True,
+                    ),
+                )
 
-            lat, lon = df["LATITUDE"].iloc[0], df["LONGITUDE"].iloc[0]
-            if not (self.min_lat <= lat <= self.max_lat and self.min_lon <= lon <= self.max_lon):
+            # Filter dates on the Arrow table so only kept rows reach pandas
+            days = t["DATE"].cast(pa.int32())
+            t = t.filter(pc.and_(pc.greater_equal(days, self._start_d32), pc.less_equal(days, self._end_d32)))
+            if t.num_rows == 0:
                 return None
+            # Sorting here, per station, lets run() stream output in order.
+            # Station files are normally date-ordered already, so check first.
+            dates = t["DATE"]
+            if not pc.all(pc.greater_equal(dates[1:], dates[:-1])).as_py():
+                t = t.sort_by("DATE")
 
-            df = df[(df["DATE"] >= self.start_date) & (df["DATE"] <= self.end_date)]
-            if df.empty:
-                return None
+            prcp = self._parse_prcp(t["PRCP"])
+            t = t.set_column(t.schema.get_field_index("PRCP"), "PRCP", prcp)
+            # Keep DATE Arrow-backed so it round-trips as date32, and PRCP as
+            # nullable int16 rather than float64
+            df = t.to_pandas(
+                types_mapper={pa.date32(): pd.ArrowDtype(pa.date32()), pa.int16(): pd.Int16Dtype()}.get
+            )
 
-            df["PRCP"] = pd.to_numeric(df["PRCP"], errors="coerce") / 10.0
             df = self._filter_flags(df)
             if df.empty:
                 return None
 
-            return df
+            return pa.Table.from_pandas(df, preserve_index=False)
 
         except Exception as e:
             print(f"⚠️ Skipping {file.name}: {e}")
             return None
 
     # -------------------------------------------------------------------------
-    def run(self):
-        """Run the full preprocessing pipeline."""
-        files = sorted(self.folder.glob("*.csv"))
+    def _process_batch(self, files: list) -> pa.Table | None:
+        """Process a batch of station files and return their rows as one table."""
+        tables = [t for t in map(self._process_one_file, files) if t is not None]
+        if not tables:
+            return None
+        # Files arrive sorted by station ID and each table is one date-sorted
+        # station, so concatenating keeps (STATION, DATE) order
+        return pa.concat_tables(tables, promote_options="default")
+
+    # -------------------------------------------------------------------------
+    def _station_files(self) -> list:
+        """List the station CSVs to process, sorted by station ID."""
+        if self.stations_file is not None:
+            # Only open files for stations the index places inside the box
+            station_ids = self._load_station_index()
+            files = [
+                self.folder / f"{sid}.csv"
+                for sid in sorted(station_ids)
+                if (self.folder / f"{sid}.csv").exists()
+            ]
+        else:
+            # scandir yields bare names, so excluded networks (mostly
+            # CoCoRaHS) are dropped before any Path is built
+            with os.scandir(self.folder) as entries:
+                names = sorted(
+                    e.name for e in entries
+                    if e.name.endswith(".csv") and not e.name.startswith(self.exclude_prefixes)
+                )
+            files = [self.folder / name for name in names]
         if not files:
             raise FileNotFoundError(f"No CSV files found in {self.folder}")
+        return files
+
+    # -------------------------------------------------------------------------
+    def _write_parquet(self, table: pa.Table, basename_template: str):
+        """Write rows into the STATION-partitioned Parquet dataset at out_csv."""
+        ds.write_dataset(
+            table, self.out_csv, format="parquet",
+            partitioning=["STATION"], partitioning_flavor="hive",
+            basename_template=basename_template,
+            existing_data_behavior="overwrite_or_ignore",
+        )
+
+    # -------------------------------------------------------------------------
+    def _clear_output(self):
+        """
+        Remove output left by a previous run, so stations that no longer
+        match cannot linger in a Parquet dataset (or a stale CSV survive a
+        run that matches nothing). A directory is only removed if it holds
+        nothing but STATION partitions.
+        """
+        if self.out_csv.is_dir():
+            foreign = [p.name for p in self.out_csv.iterdir() if not p.name.startswith("STATION=")]
+            if foreign:
+                raise FileExistsError(
+                    f"{self.out_csv} exists and is not a STATION-partitioned dataset: {foreign[:3]}"
+                )
+            shutil.rmtree(self.out_csv)
+        elif self.out_csv.exists():
+            self.out_csv.unlink()
+
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def _executor():
+        """
+        Pick the worker pool class.
+
+        On free-threaded CPython (GIL disabled) threads run the pandas and
+        Arrow work in parallel without fork or result pickling; otherwise
+        the GIL forces separate processes.
+        """
+        gil_enabled = getattr(sys, "_is_gil_enabled", lambda: True)()
+        return ProcessPoolExecutor if gil_enabled else ThreadPoolExecutor
+
+    # -------------------------------------------------------------------------
+    def _iter_batches(self, ex, batches: list, bar: tqdm):
+        """
+        Yield each batch's table (or None) in submission order.
+
+        Unlike ``Executor.map``, which submits every task up front and keeps
+        each finished result until it is consumed, at most two tasks per
+        worker are in flight, so memory is bounded by that window. ``bar``
+        advances as each batch finishes, not when its turn to be yielded comes.
+        """
+        # Done callbacks run in the worker threads of a ThreadPoolExecutor,
+        # and tqdm.update is not thread-safe
+        lock = threading.Lock()
+
+        def advance(n):
+            with lock:
+                bar.update(n)
 
+        def submit(batch):
+            fut = ex.submit(self._process_batch, batch)
+            fut.add_done_callback(lambda _, n=len(batch): advance(n))
+            return fut
+
+        batches = iter(batches)
+        pending = deque()
+        for batch in batches:
+            pending.append(submit(batch))
+            if len(pending) >= 2 * self.max_workers:
+                break
+        while pending:
+            fut = pending.popleft()
+            nxt = next(batches, None)
+            if nxt is not None:
+                pending.append(submit(nxt))
+            yield fut.result()
+
+    # -------------------------------------------------------------------------
+    def run(self):
+        """Run the full preprocessing pipeline."""
+        files = self._station_files()
         print(f"🧩 Found {len(files)} station CSVs.")
-        results = []
-
-        with ProcessPoolExecutor(max_workers=self.max_workers) as ex:
-            futures = {ex.submit(self._process_one_file, f): f for f in files}
-            for i, fut in enumerate(as_completed(futures), 1):
-                df = fut.result()
-                if df is not None:
-                    results.append(df)
-                if i % 200 == 0:
-                    print(f"  ✅ Processed {i}/{len(files)} files...")
-
-        if not results:
+        self._clear_output()
+
+        # Batching amortises task submission and result pickling over
+        # BATCH_SIZE files while keeping the batches in ID order
+        batches = [files[i:i + self.BATCH_SIZE] for i in range(0, len(files), self.BATCH_SIZE)]
+
+        # Batches are contiguous runs of the ID-sorted file list and come back
+        # in order, so writing each batch as it arrives keeps the output
+        # sorted by STATION. Memory holds the in-flight window of batches
+        # plus the int16 PRCP column kept for the closing summary.
+        # A ".parquet" output is written as a dataset partitioned by STATION.
+        parquet = self.out_csv.suffix == ".parquet"
+        writer, n_rows, n_stations, prcp = None, 0, 0, []
+        try:
+            with self._executor()(max_workers=self.max_workers) as ex, tqdm(total=len(files), unit="file") as bar:
+                for i, table in enumerate(self._iter_batches(ex, batches, bar)):
+                    if table is not None:
+                        table = table.cast(self.OUTPUT_SCHEMA)
+                        if parquet:
+                            self._write_parquet(table, f"part-{i}-{{i}}.parquet")
+                        else:
+                            if writer is None:
+                                writer = csv.CSVWriter(self.out_csv, self.OUTPUT_SCHEMA)
+                            writer.write_table(table)
+                        n_rows += table.num_rows
+                        n_stations += pc.count_distinct(table["STATION"]).as_py()
+                        prcp.extend(table["PRCP"].chunks)
+        finally:
+            if writer is not None:
+                writer.close()
+
+        if n_rows == 0:
             print("⚠️ No stations matched filters.")
             return
 
-        combined = pd.concat(results, ignore_index=True)
-        combined.sort_values(by=["STATION", "DATE"], inplace=True)
-        combined.to_csv(self.out_csv, index=False)
+        print(f"\n✅ Saved {n_rows:,} records to {self.out_csv}")
+        print(f"📍 Total stations merged: {n_stations}")
+        print("PRCP (tenths of mm):")
+        print(pa.chunked_array(prcp, pa.int16()).to_pandas().describe())
+
+    # -------------------------------------------------------------------------
+    def run_polars(self):
+        """
+        Run the pipeline as a single Polars lazy query.
+
+        Requires the optional ``polars`` package. Writes the same rows and
+        format as ``run()``, sinking the sorted query to disk with
+        ``sink_csv``/``sink_parquet`` instead of collecting it into one
+        table. This is an alternative engine, not a faster one: each file's
+        header is probed serially in this process to skip files without
+        PRCP, and because the bounding box is a row filter, every row of
+        every listed file is parsed. Pass ``stations_file`` to keep the file
+        list small. Files ``run()`` would skip for a malformed DATE are
+        dropped silently rather than reported.
+        """
+        import polars as pl
+
+        files = self._station_files()
+        self._clear_output()
+        overrides = {
+            "DATE": pl.String,
+            "LATITUDE": pl.Float32,
+            "LONGITUDE": pl.Float32,
+            "ELEVATION": pl.Float32,
+            "PRCP": pl.String,
+            "PRCP_ATTRIBUTES": pl.String,
+        }
+
+        # run() skips a file whose DATE column does not parse; drop the same
+        # files here rather than letting one bad date abort the whole query
+        date = pl.col("DATE").str.to_date("%Y-%m-%d", strict=False)
+        valid_dates = (date.is_not_null() | pl.col("DATE").is_null()).all()
+
+        # Station files carry different element columns; skip those without PRCP
+        frames = []
+        for f in files:
+            lf = pl.scan_csv(f, schema_overrides=overrides)
+            if set(self.USECOLS) <= set(lf.collect_schema().names()):
+                frames.append(lf.select(self.USECOLS).filter(valid_dates).with_columns(date))
+        if not frames:
+            print("⚠️ No stations matched filters.")
+            return
+
+        flags = (
+            pl.col("PRCP_ATTRIBUTES").fill_null("")
+            .str.split_exact(",", 1).struct.rename_fields(["MFLAG", "QFLAG"])
+        )
+        query = (
+            pl.concat(frames, how="vertical_relaxed")
+            .filter(
+                pl.col("LATITUDE").is_between(self.min_lat, self.max_lat)
+                & pl.col("LONGITUDE").is_between(self.min_lon, self.max_lon)
+                & pl.col("DATE").is_between(pd.Timestamp(self.start_date).date(), pd.Timestamp(self.end_date).date())
+            )
+            # Bad PRCP tokens become null, as in _parse_prcp
+            .with_columns(pl.col("PRCP").str.strip_chars().cast(pl.Int16, strict=False), flags.alias("FLAGS"))
+            .unnest("FLAGS")
+            .with_columns(pl.col("MFLAG").str.strip_chars(), pl.col("QFLAG").fill_null("").str.strip_chars())
+            .filter(pl.col("MFLAG").is_in(self.keep_mflags) & (pl.col("QFLAG") == ""))
+            .with_columns(
+                pl.when(pl.col("MFLAG").is_in(["S", "T"])).then(0).otherwise(pl.col("PRCP")).cast(pl.Int16).alias("PRCP")
+            )
+            .sort(["STATION", "DATE"])
+            # Arrow's CSV reader turns empty strings into nulls; match it
+            .with_columns(
+                pl.when(pl.col(c) == "").then(None).otherwise(pl.col(c)).alias(c)
+                for c in ("NAME", "PRCP_ATTRIBUTES")
+            )
+            .select(self.OUTPUT_SCHEMA.names)
+        )
+
+        if self.out_csv.suffix == ".parquet":
+            query.sink_parquet(pl.PartitionBy(self.out_csv, key="STATION", include_key=False), mkdir=True)
+            written = pl.scan_parquet(self.out_csv, hive_partitioning=True)
+        else:
+            self._sink_csv(query)
+            written = pl.scan_csv(self.out_csv, schema_overrides={"PRCP": pl.Int16})
+
+        # Summarise from the written output so the result is never held whole
+        summary = written.select("STATION", "PRCP").collect()
+        if summary.height == 0:
+            self._clear_output()
+            print("⚠️ No stations matched filters.")
+            return
+
+        print(f"\n✅ Saved {summary.height:,} records to {self.out_csv}")
+        print(f"📍 Total stations merged: {summary['STATION'].n_unique()}")
+        print("PRCP (tenths of mm):")
+        print(summary["PRCP"].to_pandas().describe())
+
+    # -------------------------------------------------------------------------
+    def _sink_csv(self, query):
+        """
+        Sink a Polars query to out_csv in the format of Arrow's CSV writer:
+        quoted header and strings, empty nulls, and floats without a
+        trailing ".0".
+        """
+        import polars as pl
+
+        cells = []
+        for field in self.OUTPUT_SCHEMA:
+            col = pl.col(field.name)
+            if pa.types.is_string(field.type):
+                col = pl.format('"{}"', col.str.replace_all('"', '""', literal=True))
+            elif pa.types.is_floating(field.type):
+                col = col.cast(pl.String).str.replace(r"\.0$", "")
+            cells.append(col.alias(field.name))
 
-        print(f"\n✅ Saved {len(combined):,} records to {self.out_csv}")
-        print(f"📍 Total stations merged: {combined['STATION'].nunique()}")
-        print(combined["PRCP"].describe())
\ No newline at end of file
+        with open(self.out_csv, "w", newline="") as f:
+            f.write(",".join(f'"{name}"' for name in self.OUTPUT_SCHEMA.names) + "\n")
+            f.flush()
+            query.select(cells).sink_csv(f, include_header=False, quote_style="never")
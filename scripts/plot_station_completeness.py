@@ -3,7 +3,7 @@
 """
 Visualize GHCN-Daily station completeness (2005–2024)
 ----------------------------------------------------
-- Loads merged daily precipitation CSV.
+- Loads merged daily precipitation (CSV, or Parquet dataset partitioned by STATION).
 - Computes completeness (% of available days).
 - Filters to stations with ≥80% data coverage.
 - Plots histogram and map of station completeness.
@@ -12,6 +12,7 @@ Author: Omid Zandi
 """
 #%%
 import pandas as pd
+import pyarrow.parquet as pq
 import matplotlib.pyplot as plt
 import cartopy.crs as ccrs
 import cartopy.feature as cfeature
@@ -25,7 +26,7 @@ from pathlib import Path
 # ============================================================
 # CONFIGURATION
 # ============================================================
-CSV_PATH = "../ghcn_precip_2005_2024_buffer.csv"
+DATA_PATH = "../ghcn_precip_2005_2024_buffer.parquet"  # or the ".csv" output
 START_DATE = "2005-01-01"
 END_DATE   = "2024-12-31"
 MIN_LAT, MAX_LAT = 29.5, 39
@@ -37,10 +38,11 @@ DPI = 300
 # ============================================================
 # LOAD DATA
 # ============================================================
-df = pd.read_csv(
-    CSV_PATH,
-    usecols=["STATION", "LATITUDE", "LONGITUDE", "PRCP"],
-)
+COLUMNS = ["STATION", "LATITUDE", "LONGITUDE", "PRCP"]
+if Path(DATA_PATH).suffix == ".parquet":
+    df = pq.read_table(DATA_PATH, columns=COLUMNS).to_pandas(types_mapper=pd.ArrowDtype)
+else:
+    df = pd.read_csv(DATA_PATH, usecols=COLUMNS)
 
 print(f"📥 Loaded {len(df):,} daily records across {df['STATION'].nunique()} stations.")
 
@@ -51,10 +53,11 @@ station_stats = (
           LATITUDE=("LATITUDE", "first"),
           LONGITUDE=("LONGITUDE", "first"),
           N_obs=("PRCP", "count"), 
-          mean_prcp=("PRCP", "mean")   # mean daily precipitation (mm/day)
+          mean_prcp=("PRCP", "mean")   # mean daily precipitation (tenths of mm/day)
       )
       .reset_index()
 )
+station_stats["mean_prcp"] *= 0.1  # PRCP is stored in tenths of mm → mm/day
 
 # --- Compute total number of days in the selected range ---
 n_days = (pd.to_datetime(END_DATE) - pd.to_datetime(START_DATE)).days + 1
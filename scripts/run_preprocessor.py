@@ -8,7 +8,7 @@ from ghcn_preprocess import GHCNPreprocessor
 if __name__ == "__main__":
     processor = GHCNPreprocessor(
         folder="/ra1/pubdat/ghcn_daily/study_area_countries_stations",
-        out_csv="ghcn_precip_2005_2024_buffer.csv",
+        out_csv="ghcn_precip_2005_2024_buffer.parquet",  # ".csv" for a single CSV
         min_lat=30,
         max_lat=38,
         min_lon=-115.5,
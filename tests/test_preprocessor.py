@@ -1,5 +1,10 @@
+import sys
+import numpy as np
+import pandas as pd
 import pytest
 from ghcn_preprocess import GHCNPreprocessor
+from ghcn_preprocess.preprocessor import _flag_mask, _flag_mask_numpy
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from pathlib import Path
 
 def test_preprocessor_initialization():
@@ -10,4 +15,226 @@ def test_preprocessor_initialization():
         min_lon=-116, max_lon=-107
     )
     assert isinstance(processor, GHCNPreprocessor)
-    assert isinstance(processor.folder, Path)
\ No newline at end of file
+    assert isinstance(processor.folder, Path)
+
+HEADER = '"STATION","DATE","LATITUDE","LONGITUDE","ELEVATION","NAME","PRCP","PRCP_ATTRIBUTES"\n'
+
+# Two stations inside BBOX, and two days that both survive the flag filter
+IN_BOX = [("USW00023183", 33.4, -112.0), ("USC00021026", 32.2, -110.9)]
+ROWS = [("2010-01-01", "   25", ",,7,0700"), ("2010-01-02", "    3", "T,,7,0700")]
+BBOX = dict(min_lat=30, max_lat=38, min_lon=-116, max_lon=-107, max_workers=2)
+
+
+def _write_station(folder, station, lat, lon, rows):
+    path = Path(folder) / f"{station}.csv"
+    lines = [
+        f'"{station}","{date}","{lat}","{lon}","728.5","TEST, AZ US","{prcp}","{attrs}"\n'
+        for date, prcp, attrs in rows
+    ]
+    path.write_text(HEADER + "".join(lines))
+    return path
+
+
+def _processor(folder, out, **kwargs):
+    """A GHCNPreprocessor over the test bounding box; kwargs override it."""
+    return GHCNPreprocessor(folder=str(folder), out_csv=str(out), **{**BBOX, **kwargs})
+
+
+def _run_both(data, tmp_path, suffix=".csv", **kwargs):
+    """Run both engines over data; return their output paths (pandas, polars)."""
+    out_pd, out_pl = tmp_path / f"pandas{suffix}", tmp_path / f"polars{suffix}"
+    _processor(data, out_pd, **kwargs).run()
+    _processor(data, out_pl, **kwargs).run_polars()
+    return out_pd, out_pl
+
+
+@pytest.fixture
+def data(tmp_path):
+    folder = tmp_path / "data"
+    folder.mkdir()
+    return folder
+
+
+def test_process_one_file_filters_and_converts(tmp_path):
+    path = _write_station(tmp_path, "USC00021026", 32.2, -110.9, [
+        ("2009-12-31", "   50", ",,7,0700"),
+        ("2010-01-01", "   25", ",,7,0700"),
+        ("2010-01-02", "    3", "T,,7,0700"),
+        ("2010-01-03", "   40", ",X,7,0700"),
+        ("2010-01-04", "   12", "P,,7,0700"),
+    ])
+    processor = _processor(tmp_path, tmp_path / "out.csv", start_date="2010-01-01", end_date="2010-12-31")
+    df = processor._process_one_file(path).to_pandas()
+    assert list(df["PRCP"]) == [25, 0]
+    assert list(df["MFLAG"]) == ["", "T"]
+
+
+def test_process_one_file_coerces_bad_prcp(tmp_path):
+    path = _write_station(tmp_path, "USC00021026", 32.2, -110.9, [
+        ("2010-01-01", "     ", ",,7,0700"),
+        ("2010-01-02", "  abc", ",,7,0700"),
+        ("2010-01-03", "99999", ",,7,0700"),
+        ("2010-01-04", "   12", ",,7,0700"),
+    ])
+    processor = _processor(tmp_path, tmp_path / "out.csv", start_date="2010-01-01", end_date="2010-12-31")
+    df = processor._process_one_file(path).to_pandas()
+    assert df["PRCP"].isna().tolist() == [True, True, True, False]
+    assert df["PRCP"].iloc[3] == 12
+
+
+def test_process_one_file_outside_bbox(tmp_path):
+    path = _write_station(tmp_path, "USC00049999", 40.0, -120.0, ROWS[:1])
+    assert _processor(tmp_path, tmp_path / "out.csv")._process_one_file(path) is None
+
+
+def test_load_station_index(tmp_path):
+    index = tmp_path / "ghcnd-stations.txt"
+    index.write_text(
+        "USC00021026  32.2286 -110.9542  728.5 AZ TUCSON                         \n"
+        "US1AZPM0001  32.3000 -111.0000  728.5 AZ TUCSON 1.2 NE                  \n"
+        "USC00049999  40.0000 -120.0000  100.0 CA OUTSIDE                        \n"
+    )
+    processor = _processor(tmp_path, tmp_path / "out.csv", stations_file=str(index))
+    assert processor._load_station_index() == {"USC00021026"}
+
+
+def test_run_polars_matches_run(data, tmp_path):
+    pl = pytest.importorskip("polars")
+    rows = ROWS + [("2010-01-03", "", ""), ("2010-01-04", "   40", ",X,7,0700")]
+    for station, lat, lon in IN_BOX + [("US1AZPM0001", 32.3, -111.0)]:
+        _write_station(data, station, lat, lon, rows)
+
+    out_pd, out_pl = _run_both(data, tmp_path)
+    assert out_pl.read_text() == out_pd.read_text()
+    assert pl.read_csv(out_pl)["STATION"].unique().sort().to_list() == ["USC00021026", "USW00023183"]
+
+
+def test_run_polars_matches_run_on_bad_prcp_and_no_match(data, tmp_path):
+    pytest.importorskip("polars")
+    _write_station(data, "USC00021026", 32.2, -110.9, [
+        ("2010-01-01", "     ", ",,7,0700"),
+        ("2010-01-02", "  abc", ",,7,0700"),
+        ("2010-01-03", "   12", ",,7,0700"),
+    ])
+    out_pd, out_pl = _run_both(data, tmp_path)
+    assert out_pl.read_text() == out_pd.read_text()
+
+    # Nothing in the box: neither engine writes an output file
+    out_pd, out_pl = _run_both(data, tmp_path, min_lat=40, max_lat=45)
+    assert not out_pd.exists()
+    assert not out_pl.exists()
+
+
+def test_run_polars_skips_file_with_malformed_date(data, tmp_path):
+    pytest.importorskip("polars")
+    _write_station(data, "USC00021026", 32.2, -110.9, ROWS)
+    _write_station(data, "USW00023183", 33.4, -112.0, ROWS + [("2010-02-30", "    1", ",,7,0700")])
+
+    out_pd, out_pl = _run_both(data, tmp_path)
+    assert out_pl.read_text() == out_pd.read_text()
+    assert set(pd.read_csv(out_pl)["STATION"]) == {"USC00021026"}
+
+
+def test_run_polars_writes_same_parquet_as_run(data, tmp_path):
+    pytest.importorskip("polars")
+    pq = pytest.importorskip("pyarrow.parquet")
+    for station, lat, lon in IN_BOX:
+        _write_station(data, station, lat, lon, [ROWS[0], ("2010-01-02", "  abc", "T,,7,0700")])
+
+    out_pd, out_pl = _run_both(data, tmp_path, suffix=".parquet")
+    assert sorted(p.name for p in out_pl.iterdir()) == ["STATION=USC00021026", "STATION=USW00023183"]
+    expected = pq.read_table(out_pd).to_pandas()
+    actual = pq.read_table(out_pl).to_pandas()[expected.columns]
+    pd.testing.assert_frame_equal(actual, expected)
+
+
+def test_run_writes_parquet_partitioned_by_station(data, tmp_path):
+    pq = pytest.importorskip("pyarrow.parquet")
+    for station, lat, lon in IN_BOX:
+        _write_station(data, station, lat, lon, ROWS)
+
+    out = tmp_path / "out.parquet"
+    _processor(data, out).run()
+
+    assert sorted(p.name for p in out.iterdir()) == ["STATION=USC00021026", "STATION=USW00023183"]
+    df = pq.read_table(out, columns=["STATION", "PRCP"]).to_pandas()
+    assert len(df) == 4
+    assert list(df["PRCP"]) == [25, 0, 25, 0]
+
+
+def test_parquet_rerun_drops_stations_outside_new_bbox(data, tmp_path):
+    pq = pytest.importorskip("pyarrow.parquet")
+    for station, lat, lon in IN_BOX:
+        _write_station(data, station, lat, lon, ROWS)
+
+    out = tmp_path / "out.parquet"
+    _processor(data, out).run()
+    _processor(data, out, max_lat=33).run()
+
+    assert [p.name for p in out.iterdir()] == ["STATION=USC00021026"]
+    assert pq.read_table(out).num_rows == 2
+
+
+def test_parquet_output_refuses_foreign_directory(data, tmp_path):
+    _write_station(data, "USC00021026", 32.2, -110.9, ROWS[:1])
+    out = tmp_path / "out.parquet"
+    out.mkdir()
+    (out / "notes.txt").write_text("keep me")
+
+    with pytest.raises(FileExistsError):
+        _processor(data, out).run()
+    assert (out / "notes.txt").exists()
+
+
+@pytest.mark.parametrize("mask", [_flag_mask, _flag_mask_numpy])
+def test_flag_mask(mask):
+    # MFLAG code -1 is a flag outside the fixed categories
+    mflag = np.array([0, 1, 2, 3, -1, 2], dtype=np.int8)
+    qflag = np.array([0, 0, 0, 0, 0, 1], dtype=np.int8)
+    keep = np.array([0, 2, 3], dtype=np.int8)
+
+    assert mask(mflag, qflag, keep, 0).tolist() == [True, False, True, True, False, False]
+    # No kept MFLAGs
+    assert not mask(mflag, qflag, np.array([], dtype=np.int8), 0).any()
+    # No empty QFLAG category in the file
+    assert not mask(mflag, qflag, keep, -2).any()
+
+
+@pytest.mark.parametrize("batch_size", [1, 32])
+def test_run_orders_output_by_station_and_date(data, tmp_path, monkeypatch, batch_size):
+    monkeypatch.setattr(GHCNPreprocessor, "BATCH_SIZE", batch_size)
+    shuffled = [
+        ("2010-01-03", "   30", ",,7,0700"),
+        ("2010-01-01", "   10", ",,7,0700"),
+        ("2010-01-02", "   20", ",,7,0700"),
+    ]
+    _write_station(data, "USW00023183", 33.4, -112.0, shuffled)
+    _write_station(data, "USC00021026", 32.2, -110.9, shuffled[::-1])
+
+    out = tmp_path / "out.csv"
+    _processor(data, out).run()
+
+    df = pd.read_csv(out)
+    assert list(zip(df["STATION"], df["DATE"])) == [
+        (station, f"2010-01-0{day}")
+        for station in ("USC00021026", "USW00023183")
+        for day in (1, 2, 3)
+    ]
+    assert list(df["PRCP"]) == [10, 20, 30, 10, 20, 30]
+
+
+def test_executor_follows_gil(data, tmp_path, monkeypatch):
+    monkeypatch.setattr(sys, "_is_gil_enabled", lambda: True, raising=False)
+    assert GHCNPreprocessor._executor() is ProcessPoolExecutor
+    monkeypatch.setattr(sys, "_is_gil_enabled", lambda: False, raising=False)
+    assert GHCNPreprocessor._executor() is ThreadPoolExecutor
+
+    # Run the thread-pool path end to end
+    for station, lat, lon in IN_BOX:
+        _write_station(data, station, lat, lon, ROWS)
+
+    out = tmp_path / "out.csv"
+    _processor(data, out).run()
+    df = pd.read_csv(out)
+    assert list(df["STATION"]) == ["USC00021026", "USC00021026", "USW00023183", "USW00023183"]
+    assert list(df["PRCP"]) == [25, 0, 25, 0]